@@ -1,6 +1,7 @@
 from path import *
 from map import *
 import time
+import numpy as np
 
 
 def get_time():
@@ -33,13 +34,12 @@ print(f"Took {end - start}ms")
 
 str_map = course.str_map.copy()
 
-# Apply the path to the copy of the str_map
-for point in path:
-    pos = point.get_position()
-    val = str_map[pos[0]][pos[1]]
-    if val == ' S ' or val == ' G ':
-        continue
-
-    str_map[pos[0]][pos[1]] = -2
+# Apply the path to the copy of the str_map, leaving the start and
+# goal markers in place
+xs = np.fromiter((point.x for point in path), dtype=np.int32, count=len(path))
+ys = np.fromiter((point.y for point in path), dtype=np.int32, count=len(path))
+values = str_map[xs, ys]
+mask = (values != ' S ') & (values != ' G ')
+str_map[xs[mask], ys[mask]] = -2
 
 course.show_map(map=str_map)
@@ -4,12 +4,20 @@ from PIL import Image
 
 np.set_printoptions(threshold=np.inf, linewidth=300)
 
+# Arc cost used in the cost grid for positions that can not be visited
+ILLEGAL_COST = 0xFFFF
+
 
 # EDITED: Renamed to CourseMap
 class CourseMap:
     def __init__(self, task=1):
         self.start_pos, self.goal_pos, self.end_goal_pos, self.path_to_map = self.fill_critical_positions(task)
         self.int_map, self.str_map = self.read_map(self.path_to_map)
+        # Preloaded copy of the integer map used for arc cost lookups during a search. The flat view shares memory
+        # with the grid, and the cost of (x, y) is found at (x + 1) * stride + y + 1
+        self.cost_grid = self.build_cost_grid(self.int_map)
+        self.cost_flat = self.cost_grid.ravel()
+        self.stride = self.cost_grid.shape[1]
         self.tmp_cell_value = self.get_cell_value(self.goal_pos)
         self.set_cell_value(self.start_pos, ' S ')
         self.set_cell_value(self.goal_pos, ' G ')
@@ -38,6 +46,28 @@ class CourseMap:
         data_str[data_str == '4'] = ' ; '
         return data, data_str
 
+    @staticmethod
+    def build_cost_grid(int_map):
+        """
+        Builds the grid of arc costs used when searching the map. Illegal positions are given ILLEGAL_COST, and the
+        grid is padded by one illegal cell on every side. This way the position (x, y) is found at (x + 1, y + 1), and
+        all adjacent positions of a position on the map can be looked up without checking the bounds first.
+        :param int_map: The integer map
+        :return: The padded cost grid
+        """
+        cost_grid = np.full((int_map.shape[0] + 2, int_map.shape[1] + 2), ILLEGAL_COST, dtype=np.uint16)
+        cost_grid[1:-1, 1:-1] = np.where(int_map == -1, ILLEGAL_COST, int_map)
+        return cost_grid
+
+    def set_cost_grid_value(self, pos, value):
+        """
+        Updates the arc cost of a position in the cost grid
+        :param pos: The position on the map
+        :param value: The integer map value of the position
+        :return: nothing.
+        """
+        self.cost_grid[pos[0] + 1, pos[1] + 1] = ILLEGAL_COST if value == -1 else value
+
     def fill_critical_positions(self, task):
         """
         Fills the important positions for the current task. Given the task, the path to the correct map is set, and the
@@ -116,6 +146,7 @@ class CourseMap:
             self.str_map[pos[0], pos[1]] = value
         else:
             self.int_map[pos[0], pos[1]] = value
+            self.set_cost_grid_value(pos, value)
 
     def print_map(self, map_to_print):
         # For every column in provided map, print it
@@ -155,6 +186,7 @@ class CourseMap:
         else:
             str_value = str(value)
         self.int_map[pos[0]][pos[1]] = value
+        self.set_cost_grid_value(pos, value)
         self.str_map[pos[0]][pos[1]] = str_value
         self.str_map[goal_pos[0], goal_pos[1]] = ' G '
 